@@ -10,34 +10,181 @@ Endpoints:
 
 import os
 import sys
-import json
-from flask import Flask, request, jsonify
+import threading
+import orjson
+import xxhash
+from cachetools import LRUCache, TTLCache
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import API_HOST, API_PORT, DEBUG, DATA_DIR, MODEL_DIR
+from config import (
+    API_HOST, API_PORT, DEBUG, DATA_DIR, MODEL_PATH,
+    PREDICT_CACHE_CONFIG, GRAPH_CACHE_CONFIG
+)
 from predict import FraudPredictor
+from models.gnn_model import HydraGNN
 from utils.data_generator import FraudDataGenerator
 from utils.graph_builder import TransactionGraphBuilder
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    Serializes responses in Rust instead of the stdlib json module, and
+    accepts numpy arrays/scalars directly (e.g. fraud probabilities).
+    """
+
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for frontend
 
 # Global predictor instance
 predictor = None
 
+# Cached /predict responses keyed by transaction payload hash
+prediction_cache = TTLCache(
+    maxsize=PREDICT_CACHE_CONFIG["maxsize"],
+    ttl=PREDICT_CACHE_CONFIG["ttl"]
+)
+prediction_cache_lock = threading.Lock()
+
+# Records per chunk when streaming /graph responses
+STREAM_CHUNK_SIZE = 1000
+
+# Shared graph builder (build_graph keeps no per-call state on the instance)
+graph_builder = TransactionGraphBuilder()
+
+# Parsed /graph datasets: path -> (mtime, dataset), bounded since the
+# path comes from the caller
+graph_dataset_cache = LRUCache(maxsize=GRAPH_CACHE_CONFIG["maxsize"])
+graph_dataset_cache_lock = threading.Lock()
+
+
+predictor_lock = threading.Lock()
+
 
 def get_predictor():
-    """Get or initialize predictor"""
+    """
+    Get or initialize predictor
+    
+    Reloads when the checkpoint on disk changed, so a model retrained by
+    any gunicorn worker (or by train.py) reaches every worker.
+    """
     global predictor
-    if predictor is None:
-        predictor = FraudPredictor()
+    if predictor is None or predictor.is_stale():
+        with predictor_lock:
+            if predictor is None or predictor.is_stale():
+                predictor = FraudPredictor()
+                
+                # Cached predictions came from the old model
+                with prediction_cache_lock:
+                    prediction_cache.clear()
     return predictor
 
 
+# Load and warm the model at import, so gunicorn --preload does it once.
+# Skipped under `python api.py`: main() either execs gunicorn (which loads
+# it itself) or loads it before starting the dev server.
+if __name__ != "__main__":
+    get_predictor()
+
+
+def prediction_cache_key(transactions, threshold):
+    """Build cache key from a fast hash of the transactions payload"""
+    digest = xxhash.xxh64(orjson.dumps(transactions)).hexdigest()
+    return f"{digest}:{threshold}"
+
+
+def load_graph_dataset(path):
+    """Load dataset JSON, reusing the parsed copy while the file is unchanged"""
+    mtime = os.path.getmtime(path)
+    
+    with graph_dataset_cache_lock:
+        cached = graph_dataset_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    
+    # Parse outside the lock so other requests aren't held up
+    with open(path, 'rb') as f:
+        dataset = orjson.loads(f.read())
+    
+    with graph_dataset_cache_lock:
+        graph_dataset_cache[path] = (mtime, dataset)
+    return dataset
+
+
+def format_node(acc, predictions, labels):
+    """Format account as a vis.js node, applying model predictions if any"""
+    acc_id = acc["id"]
+    pred_data = predictions.get(acc_id, {})
+    
+    node_type = acc.get("type", "normal")
+    if pred_data.get("label") == "fraud":
+        node_type = "mule" if pred_data["risk_score"] >= 80 else "suspect"
+    
+    return {
+        "id": acc_id,
+        "label": acc.get("name", acc_id),
+        "bank": acc.get("bank", "Unknown"),
+        "type": node_type,
+        "riskScore": pred_data.get("risk_score", labels.get(acc_id, 0) * 100),
+        "balance": acc.get("balance", 0)
+    }
+
+
+def format_edge(i, tx):
+    """Format transaction as a vis.js edge"""
+    return {
+        "from": tx.get("from") or tx.get("debtor"),
+        "to": tx.get("to") or tx.get("creditor"),
+        "amount": tx.get("amount", 0),
+        "id": tx.get("id") or f"tx_{i}"
+    }
+
+
+def stream_json_array(records, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the comma-separated JSON encoding of records, chunk_size at a time"""
+    chunk = []
+    separator = b""
+    
+    for record in records:
+        chunk.append(orjson.dumps(record))
+        if len(chunk) >= chunk_size:
+            yield separator + b",".join(chunk)
+            separator = b","
+            chunk = []
+    
+    if chunk:
+        yield separator + b",".join(chunk)
+
+
+def stream_graph_json(nodes, edges, info):
+    """Yield /graph response body: {"nodes": [...], "edges": [...], "info": {...}}"""
+    yield b'{"nodes":['
+    yield from stream_json_array(nodes)
+    yield b'],"edges":['
+    yield from stream_json_array(edges)
+    yield b'],"info":' + orjson.dumps({
+        "num_nodes": info["num_nodes"],
+        "num_edges": info["num_edges"]
+    }) + b'}'
+
+
 @app.route("/", methods=["GET"])
 def home():
     """Home endpoint with API info"""
@@ -64,7 +211,7 @@ def status():
     return jsonify({
         "status": "running",
         "model_loaded": model_loaded,
-        "model_path": os.path.join(MODEL_DIR, "best_model.pt"),
+        "model_path": MODEL_PATH,
         "message": "Ready" if model_loaded else "Model not trained yet"
     })
 
@@ -111,23 +258,32 @@ def predict():
                 "message": "Please call POST /train first"
             }), 503
         
-        predictions = pred.predict(transactions, threshold)
-        high_risk = pred.get_high_risk_accounts(predictions, min_score=70)
+        # Repeated payloads (dashboard polling, retries) skip inference
+        cache_key = prediction_cache_key(transactions, threshold)
+        with prediction_cache_lock:
+            cached = prediction_cache.get(cache_key)
         
-        # Summary statistics
-        fraud_count = sum(1 for p in predictions if p["label"] == "fraud")
-        avg_risk = sum(p["risk_score"] for p in predictions) / len(predictions)
+        if cached is not None:
+            return jsonify(cached)
         
-        return jsonify({
+        predictions, stats = pred.predict(transactions, threshold, return_summary=True)
+        high_risk = pred.get_high_risk_accounts(predictions, min_score=70)
+        
+        result = {
             "predictions": predictions,
             "high_risk": high_risk,
             "summary": {
                 "total_accounts": len(predictions),
-                "fraud_detected": fraud_count,
+                "fraud_detected": stats["fraud_detected"],
                 "high_risk_count": len(high_risk),
-                "average_risk_score": round(avg_risk, 1)
+                "average_risk_score": round(stats["average_risk_score"], 1)
             }
-        })
+        }
+        
+        with prediction_cache_lock:
+            prediction_cache[cache_key] = result
+        
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -161,65 +317,36 @@ def get_graph():
                 dataset = generator.generate_dataset()
                 generator.save_dataset(dataset, data_path)
             
-            with open(data_path, 'r', encoding='utf-8') as f:
-                dataset = json.load(f)
+            dataset = load_graph_dataset(data_path)
         else:
-            with open(source, 'r', encoding='utf-8') as f:
-                dataset = json.load(f)
+            dataset = load_graph_dataset(source)
         
         transactions = dataset.get("transactions", [])
         accounts = dataset.get("accounts", [])
         labels = dataset.get("labels", {})
         
         # Build graph for visualization
-        builder = TransactionGraphBuilder()
-        graph_data, info = builder.build_graph(transactions, labels)
+        graph_data, info = graph_builder.build_graph(transactions, labels)
         
         # Get predictions if model available
         pred = get_predictor()
         predictions = {}
         
         if pred.model is not None:
-            pred_results = pred.predict(transactions)
+            # Reuse the graph built above instead of rebuilding it
+            pred_results = pred.predict_from_graph(graph_data, info)
             predictions = {p["account_id"]: p for p in pred_results}
         
-        # Format nodes for frontend (vis.js format)
-        nodes = []
-        for acc in accounts:
-            acc_id = acc["id"]
-            pred_data = predictions.get(acc_id, {})
-            
-            node_type = acc.get("type", "normal")
-            if pred_data.get("label") == "fraud":
-                node_type = "mule" if pred_data["risk_score"] >= 80 else "suspect"
-            
-            nodes.append({
-                "id": acc_id,
-                "label": acc.get("name", acc_id),
-                "bank": acc.get("bank", "Unknown"),
-                "type": node_type,
-                "riskScore": pred_data.get("risk_score", labels.get(acc_id, 0) * 100),
-                "balance": acc.get("balance", 0)
-            })
-        
-        # Format edges for frontend
-        edges = []
-        for tx in transactions:
-            edges.append({
-                "from": tx.get("from") or tx.get("debtor"),
-                "to": tx.get("to") or tx.get("creditor"),
-                "amount": tx.get("amount", 0),
-                "id": tx.get("id", f"tx_{len(edges)}")
-            })
+        # Format nodes (vis.js format) and edges up front, so bad records
+        # still fail here with a JSON 500; only the encoding is streamed,
+        # after the status line has gone out
+        nodes = [format_node(acc, predictions, labels) for acc in accounts]
+        edges = [format_edge(i, tx) for i, tx in enumerate(transactions)]
         
-        return jsonify({
-            "nodes": nodes,
-            "edges": edges,
-            "info": {
-                "num_nodes": info["num_nodes"],
-                "num_edges": info["num_edges"]
-            }
-        })
+        return Response(
+            stream_graph_json(nodes, edges, info),
+            mimetype="application/json"
+        )
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -247,15 +374,23 @@ def train_model():
         data = request.get_json() or {}
         config = data.get("config")
         
+        # HydraGNN is unrolled into a fixed number of conv layers
+        num_layers = (config or {}).get("num_layers", 2)
+        if (isinstance(num_layers, bool) or not isinstance(num_layers, int)
+                or not 1 <= num_layers <= HydraGNN.MAX_LAYERS):
+            return jsonify({
+                "error": "Invalid config",
+                "message": f"num_layers must be an integer between 1 and {HydraGNN.MAX_LAYERS}"
+            }), 400
+        
         # Load data and train
         dataset = load_or_generate_data()
         graph_data, info, builder = prepare_data(dataset)
         
         model, metrics = train(graph_data, config)
         
-        # Reload predictor
-        global predictor
-        predictor = FraudPredictor()
+        # Reload predictor (other workers notice the new checkpoint mtime)
+        get_predictor()
         
         return jsonify({
             "status": "success",
@@ -318,15 +453,19 @@ def main():
     print(f"Debug: {DEBUG}")
     print("-" * 60)
     
-    # Initialize predictor
-    get_predictor()
-    
-    # Run server
-    app.run(
-        host=API_HOST,
-        port=API_PORT,
-        debug=DEBUG
-    )
+    if DEBUG:
+        # Flask development server (single process, auto-reload)
+        get_predictor()
+        app.run(
+            host=API_HOST,
+            port=API_PORT,
+            debug=DEBUG
+        )
+    else:
+        # Production: hand over to gunicorn (see gunicorn.conf.py)
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(base_dir)
+        os.execvp("gunicorn", ["gunicorn", "-c", "gunicorn.conf.py", "api:app"])
 
 
 if __name__ == "__main__":
@@ -10,7 +10,18 @@ MODEL_CONFIG = {
     "dropout": 0.3,
     "learning_rate": 0.01,
     "epochs": 100,
-    "patience": 10  # Early stopping
+    "patience": 10,  # Early stopping
+    "min_delta": 1e-4,  # Smallest val F1 gain that counts as an improvement
+    "mixed_precision": True,  # bf16 autocast when training on CUDA (GPUs with bf16 support)
+    "grad_checkpointing": False  # Recompute activations in backward (fallback model, large graphs)
+}
+
+# Inference Configuration
+INFERENCE_CONFIG = {
+    "backend": os.getenv("INFERENCE_BACKEND", "torchscript"),  # eager | torchscript | compile | onnx
+    "quantize": os.getenv("INFERENCE_QUANTIZE", "True").lower() == "true",  # int8 Linear layers on CPU
+    "warmup_passes": 2,  # Dummy forward passes after loading
+    "warmup_node_counts": [16, 256, 1024]  # Graph sizes used for warmup
 }
 
 # Node Feature Configuration
@@ -35,10 +46,26 @@ API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", 5000))
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
 
+# Prediction cache for repeated /predict payloads
+PREDICT_CACHE_CONFIG = {
+    "maxsize": int(os.getenv("PREDICT_CACHE_SIZE", 512)),
+    "ttl": int(os.getenv("PREDICT_CACHE_TTL", 60))  # Seconds
+}
+
+# Parsed /graph datasets kept in memory (least recently used are evicted)
+GRAPH_CACHE_CONFIG = {
+    "maxsize": int(os.getenv("GRAPH_CACHE_SIZE", 4))
+}
+
+# Datasets larger than this are streamed from disk (needs ijson)
+STREAM_LOAD_MIN_BYTES = int(os.getenv("STREAM_LOAD_MIN_BYTES", 64 * 1024 * 1024))
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 MODEL_DIR = os.path.join(BASE_DIR, "checkpoints")
+MODEL_PATH = os.path.join(MODEL_DIR, "best_model.safetensors")
+LEGACY_MODEL_PATH = os.path.join(MODEL_DIR, "best_model.pt")  # torch.save format
 
 # Create directories if they don't exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for Hydra Watch AI Engine
+
+Usage:
+    gunicorn -c gunicorn.conf.py api:app
+"""
+
+import os
+import multiprocessing
+
+# Answer torch.cuda.is_available() via NVML instead of initializing the
+# CUDA driver in the master, which would not be safe to fork afterwards
+os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+
+import torch
+
+from config import API_HOST, API_PORT
+
+CUDA_AVAILABLE = torch.cuda.is_available()
+
+bind = f"{API_HOST}:{API_PORT}"
+
+# One process per core, a few threads each for I/O-bound requests. On GPU
+# every worker holds its own CUDA context and copy of the model, so default
+# to a single worker there (raise API_WORKERS if GPU memory allows).
+workers = int(os.getenv("API_WORKERS", 1 if CUDA_AVAILABLE else multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("API_THREADS", 4))
+
+# Load and warm the model once in the master, then fork workers that share
+# it copy-on-write. CUDA cannot be re-initialized in forked children, so GPU
+# servers load per worker instead.
+preload_app = not CUDA_AVAILABLE
+
+
+def post_fork(server, worker):
+    """Use one torch thread per worker - gunicorn already runs a process per core"""
+    torch.set_num_threads(1)
@@ -10,9 +10,12 @@ Uses GraphSAGE (SAmple and aggreGatE) architecture
 5. Readout - Final classification layer
 """
 
+import io
+import os
 import torch
 import torch.nn.functional as F
 from torch import nn
+from torch.utils.checkpoint import checkpoint
 
 # Try to import torch_geometric, provide fallback message if not installed
 try:
@@ -24,16 +27,22 @@ except ImportError:
     print("pip install torch-geometric torch-scatter torch-sparse")
 
 
+# Below this many nodes SimpleFraudGNN uses a dense adjacency matrix
+DENSE_ADJACENCY_MAX_NODES = 512
+
+
 class HydraGNN(nn.Module):
     """
     Graph Neural Network for detecting mule accounts (บัญชีม้า)
     
     Architecture:
     - Input: Node features (account statistics)
-    - 2-3 SAGEConv layers with message passing
+    - 1-3 SAGEConv layers with message passing
     - Output: Binary classification (Normal/Fraud)
     """
     
+    MAX_LAYERS = 3
+    
     def __init__(self, in_channels, hidden_channels=64, num_layers=2, dropout=0.3):
         """
         Initialize the GNN model
@@ -41,27 +50,34 @@ class HydraGNN(nn.Module):
         Args:
             in_channels: Number of input features per node
             hidden_channels: Hidden layer dimension
-            num_layers: Number of GNN layers
+            num_layers: Number of GNN layers (1 to MAX_LAYERS)
             dropout: Dropout probability
         """
         super(HydraGNN, self).__init__()
         
+        if not 1 <= num_layers <= self.MAX_LAYERS:
+            raise ValueError(f"num_layers must be between 1 and {self.MAX_LAYERS}, got {num_layers}")
+        
         self.num_layers = num_layers
         self.dropout = dropout
         
         # GNN layers (Message Passing)
-        self.convs = nn.ModuleList()
-        
         # First layer: input -> hidden
-        self.convs.append(SAGEConv(in_channels, hidden_channels))
+        convs = [SAGEConv(in_channels, hidden_channels)]
         
         # Middle layers: hidden -> hidden
         for _ in range(num_layers - 2):
-            self.convs.append(SAGEConv(hidden_channels, hidden_channels))
+            convs.append(SAGEConv(hidden_channels, hidden_channels))
         
         # Last conv layer: hidden -> hidden/2
         if num_layers > 1:
-            self.convs.append(SAGEConv(hidden_channels, hidden_channels // 2))
+            convs.append(SAGEConv(hidden_channels, hidden_channels // 2))
+        
+        # Named attributes instead of a ModuleList so TorchScript sees
+        # straight-line code; unused depths are None
+        self.conv0 = convs[0]
+        self.conv1 = convs[1] if num_layers > 1 else None
+        self.conv2 = convs[2] if num_layers > 2 else None
         
         # Classification layer
         final_hidden = hidden_channels // 2 if num_layers > 1 else hidden_channels
@@ -72,6 +88,18 @@ class HydraGNN(nn.Module):
             nn.Linear(16, 2)  # Binary classification: Normal/Fraud
         )
         
+        # Checkpoints saved before unrolling use ModuleList keys
+        self._register_load_state_dict_pre_hook(self._upgrade_state_dict)
+    
+    @staticmethod
+    def _upgrade_state_dict(state_dict, prefix, *args):
+        """Rename ModuleList keys from older checkpoints (convs.0.* -> conv0.*)"""
+        old_prefix = prefix + "convs."
+        for key in list(state_dict.keys()):
+            if key.startswith(old_prefix):
+                idx, rest = key[len(old_prefix):].split(".", 1)
+                state_dict[f"{prefix}conv{idx}.{rest}"] = state_dict.pop(key)
+    
     def forward(self, x, edge_index):
         """
         Forward pass through the GNN
@@ -85,13 +113,19 @@ class HydraGNN(nn.Module):
         Returns:
             out: Node predictions [num_nodes, 2]
         """
-        # Message Passing through GNN layers
-        for i, conv in enumerate(self.convs):
-            # Step 2: Message Passing
-            # Step 3: Aggregation (mean in SAGE)
-            x = conv(x, edge_index)
-            
-            # Step 4: Update with activation
+        # Step 2-3: Message Passing + Aggregation (mean in SAGE)
+        # Step 4: Update with activation
+        x = self.conv0(x, edge_index)
+        x = F.relu(x)
+        x = F.dropout(x, p=self.dropout, training=self.training)
+        
+        if self.conv1 is not None:
+            x = self.conv1(x, edge_index)
+            x = F.relu(x)
+            x = F.dropout(x, p=self.dropout, training=self.training)
+        
+        if self.conv2 is not None:
+            x = self.conv2(x, edge_index)
             x = F.relu(x)
             x = F.dropout(x, p=self.dropout, training=self.training)
         
@@ -100,21 +134,27 @@ class HydraGNN(nn.Module):
         
         return out
     
-    def predict_proba(self, x, edge_index):
+    def predict_proba(self, x, edge_index, fraud_only=False):
         """
         Get probability predictions
         
         Args:
             x: Node features
             edge_index: Edge connectivity
+            fraud_only: Return only the fraud probability column
             
         Returns:
-            probs: Probability of each class [num_nodes, 2]
+            probs: Probability of each class [num_nodes, 2],
+                or fraud probability [num_nodes] if fraud_only
         """
         self.eval()
-        with torch.no_grad():
+        with torch.inference_mode():
             logits = self.forward(x, edge_index)
-            probs = F.softmax(logits, dim=1)
+            if fraud_only:
+                # Binary softmax without the [num_nodes, 2] intermediate
+                probs = torch.sigmoid(logits[:, 1] - logits[:, 0])
+            else:
+                probs = F.softmax(logits, dim=1)
         return probs
     
     def predict(self, x, edge_index, threshold=0.5):
@@ -129,8 +169,7 @@ class HydraGNN(nn.Module):
         Returns:
             predictions: Dict with labels and scores
         """
-        probs = self.predict_proba(x, edge_index)
-        fraud_probs = probs[:, 1]  # Probability of fraud
+        fraud_probs = self.predict_proba(x, edge_index, fraud_only=True)
         
         predictions = []
         for i, prob in enumerate(fraud_probs):
@@ -151,7 +190,19 @@ class SimpleFraudGNN(nn.Module):
     Uses basic message passing with adjacency matrix
     """
     
-    def __init__(self, in_channels, hidden_channels=64, num_layers=2, dropout=0.3):
+    def __init__(self, in_channels, hidden_channels=64, num_layers=2, dropout=0.3,
+                 grad_checkpointing=False):
+        """
+        Initialize the model
+        
+        Args:
+            in_channels: Number of input features per node
+            hidden_channels: Hidden layer dimension
+            num_layers: Number of layers (1 input + num_layers - 1 message passing)
+            dropout: Dropout probability
+            grad_checkpointing: Recompute message-passing activations during
+                backward instead of storing them (less memory on large graphs)
+        """
         super(SimpleFraudGNN, self).__init__()
         
         self.layers = nn.ModuleList()
@@ -172,6 +223,7 @@ class SimpleFraudGNN(nn.Module):
         )
         
         self.dropout = dropout
+        self.grad_checkpointing = grad_checkpointing
         
     def forward(self, x, adj_matrix):
         """
@@ -179,26 +231,111 @@ class SimpleFraudGNN(nn.Module):
         
         Args:
             x: Node features [num_nodes, in_channels]
-            adj_matrix: Adjacency matrix [num_nodes, num_nodes]
+            adj_matrix: Adjacency matrix [num_nodes, num_nodes] (dense, COO or CSR)
         """
         # Initial transformation
         h = F.relu(self.layers[0](x))
         
         # Message passing
         for layer in self.layers[1:]:
-            # Aggregate neighbor features
-            neighbor_sum = torch.matmul(adj_matrix, h)
-            
-            # Concatenate self and neighbor features
-            combined = torch.cat([h, neighbor_sum], dim=1)
-            
-            # Update
-            h = F.relu(layer(combined))
-            h = F.dropout(h, p=self.dropout, training=self.training)
+            if self.grad_checkpointing and self.training:
+                h = checkpoint(self._message_passing, layer, h, adj_matrix, use_reentrant=False)
+            else:
+                h = self._message_passing(layer, h, adj_matrix)
         
         # Classification
         out = self.classifier(h)
         return out
+    
+    def _message_passing(self, layer, h, adj_matrix):
+        """One aggregate -> concatenate -> update block"""
+        # Aggregate neighbor features
+        if adj_matrix.layout != torch.strided:
+            # Sparse kernels lack reduced-precision support on some
+            # backends, so aggregate in fp32 even under autocast
+            with torch.autocast(h.device.type, enabled=False):
+                neighbor_sum = torch.sparse.mm(adj_matrix, h.float())
+        else:
+            neighbor_sum = torch.matmul(adj_matrix, h)
+        
+        # Concatenate self and neighbor features
+        combined = torch.cat([h, neighbor_sum], dim=1)
+        
+        # Update
+        h = F.relu(layer(combined))
+        return F.dropout(h, p=self.dropout, training=self.training)
+
+
+def build_adjacency(edge_index, num_nodes):
+    """
+    Build adjacency matrix for SimpleFraudGNN
+    
+    Small graphs get a dense matrix (a dense matmul is cache-friendlier
+    there); larger ones a sparse CSR matrix, so aggregation costs
+    O(edges) instead of O(nodes^2).
+    
+    Args:
+        edge_index: Edge connectivity [2, num_edges]
+        num_nodes: Number of nodes
+        
+    Returns:
+        adj: Dense or sparse CSR adjacency matrix [num_nodes, num_nodes]
+    """
+    if num_nodes < DENSE_ADJACENCY_MAX_NODES:
+        adj = torch.zeros(num_nodes, num_nodes, device=edge_index.device)
+        adj[edge_index[0], edge_index[1]] = 1
+        return adj
+    
+    # Duplicate transfers count once, same as a dense 0/1 matrix.
+    # unique() also sorts edges by row, as CSR requires.
+    edge_index = torch.unique(edge_index, dim=1)
+    values = torch.ones(edge_index.size(1), device=edge_index.device)
+    
+    crow = torch.zeros(num_nodes + 1, dtype=torch.long, device=edge_index.device)
+    crow[1:] = torch.bincount(edge_index[0], minlength=num_nodes).cumsum(0)
+    
+    return torch.sparse_csr_tensor(crow, edge_index[1], values, (num_nodes, num_nodes))
+
+
+def export_onnx(model, in_channels, path, opset_version=18):
+    """
+    Export HydraGNN to ONNX with dynamic node/edge counts
+    
+    Args:
+        model: Trained HydraGNN model
+        in_channels: Number of input features
+        path: Output .onnx file path
+        opset_version: ONNX opset (18 supports scatter reductions)
+    """
+    device = next(model.parameters()).device
+    dummy_x = torch.randn(4, in_channels, device=device)
+    dummy_edge_index = torch.tensor([[0, 1, 2], [1, 2, 3]], device=device)
+    
+    # Exported into memory so the weights are embedded (a path would let
+    # newer exporters split them into a separate .data file)
+    buffer = io.BytesIO()
+    
+    model.eval()
+    torch.onnx.export(
+        model,
+        (dummy_x, dummy_edge_index),
+        buffer,
+        opset_version=opset_version,
+        input_names=["x", "edge_index"],
+        output_names=["logits"],
+        dynamic_axes={
+            "x": {0: "num_nodes"},
+            "edge_index": {1: "num_edges"},
+            "logits": {0: "num_nodes"}
+        }
+    )
+    
+    # Serving workers may be opening the same file - write a per-process
+    # temp file and rename it into place
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
 
 
 def get_model(in_channels, config=None):
@@ -232,7 +369,8 @@ def get_model(in_channels, config=None):
             in_channels=in_channels,
             hidden_channels=config.get("hidden_channels", 64),
             num_layers=config.get("num_layers", 2),
-            dropout=config.get("dropout", 0.3)
+            dropout=config.get("dropout", 0.3),
+            grad_checkpointing=config.get("grad_checkpointing", False)
         )
 
 
@@ -256,9 +394,7 @@ if __name__ == "__main__":
     if TORCH_GEOMETRIC_AVAILABLE:
         out = model(x, edge_index)
     else:
-        adj = torch.zeros(num_nodes, num_nodes)
-        for i in range(edge_index.size(1)):
-            adj[edge_index[0, i], edge_index[1, i]] = 1
+        adj = build_adjacency(edge_index, num_nodes)
         out = model(x, adj)
     
     print(f"Output shape: {out.shape}")
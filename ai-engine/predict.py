@@ -6,15 +6,29 @@ Load trained model and make predictions on new data
 
 import os
 import sys
-import json
+import orjson
+from contextlib import nullcontext
+import numpy as np
 import torch
+from torch import nn
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import MODEL_DIR, DATA_DIR
-from models.gnn_model import get_model, TORCH_GEOMETRIC_AVAILABLE
+from config import MODEL_PATH, LEGACY_MODEL_PATH, INFERENCE_CONFIG, NODE_FEATURES
+from models.gnn_model import get_model, build_adjacency, export_onnx, TORCH_GEOMETRIC_AVAILABLE
 from utils.graph_builder import TransactionGraphBuilder
+from utils.checkpoint import load_checkpoint
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# Loaded models shared by all predictors in this process (and by workers
+# forked after loading): checkpoint path -> (mtime, model, ort_session, quantized)
+_model_cache = {}
 
 
 class FraudPredictor:
@@ -29,11 +43,19 @@ class FraudPredictor:
         Args:
             model_path: Path to model checkpoint
         """
+        # Without an explicit path, is_stale() re-resolves the default
+        # (a retrain may replace a legacy .pt with a .safetensors file)
+        self.fixed_path = model_path is not None
         if model_path is None:
-            model_path = os.path.join(MODEL_DIR, "best_model.pt")
+            model_path = self.default_model_path()
         
+        self.model_path = model_path
+        self.model_mtime = None  # Checkpoint mtime when loaded
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
+        self.ort_session = None
+        self.quantized = False
+        self.stream = torch.cuda.Stream() if self.device.type == "cuda" else None
         self.graph_builder = TransactionGraphBuilder()
         
         if os.path.exists(model_path):
@@ -42,33 +64,186 @@ class FraudPredictor:
             print(f"Warning: Model not found at {model_path}")
             print("Please run train.py first to train the model")
     
+    @staticmethod
+    def default_model_path():
+        """Checkpoint to use when none is given: safetensors, else legacy .pt"""
+        if not os.path.exists(MODEL_PATH) and os.path.exists(LEGACY_MODEL_PATH):
+            return LEGACY_MODEL_PATH
+        return MODEL_PATH
+    
+    def is_stale(self):
+        """
+        Check whether the checkpoint on disk differs from the loaded one
+        
+        Long-running servers call this per request, so every worker picks
+        up a model retrained by another process (one stat() call).
+        
+        Returns:
+            bool: True if a new predictor should be created
+        """
+        path = self.model_path if self.fixed_path else self.default_model_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return path != self.model_path or mtime != self.model_mtime
+    
     def load_model(self, model_path):
         """Load model from checkpoint"""
+        cache_key = os.path.abspath(model_path)
+        mtime = os.path.getmtime(model_path)
+        self.model_path = model_path
+        self.model_mtime = mtime
+        
+        # Reuse an already-loaded model unless the checkpoint changed
+        cached = _model_cache.get(cache_key)
+        if cached is not None and cached[0] == mtime:
+            _, self.model, self.ort_session, self.quantized = cached
+            return
+        
         print(f"Loading model from {model_path}")
         
-        checkpoint = torch.load(model_path, map_location=self.device)
-        config = checkpoint.get("config", {})
+        state_dict, meta = load_checkpoint(model_path, self.device)
+        config = meta.get("config", {})
         
-        # We need to know input channels - use default 7 features
-        in_channels = 7
+        # Older checkpoints don't store input channels - assume current features
+        in_channels = meta.get("in_channels", len(NODE_FEATURES))
         
         self.model = get_model(in_channels, config)
-        self.model.load_state_dict(checkpoint["model_state_dict"])
+        self.model.load_state_dict(state_dict)
         self.model = self.model.to(self.device)
         self.model.eval()
         
-        print(f"Model loaded (trained for {checkpoint.get('epoch', '?')} epochs)")
+        backend = INFERENCE_CONFIG["backend"]
+        
+        # Dynamic int8 quantization of Linear layers for CPU serving
+        # (ONNX export needs the float model)
+        if self.device.type == "cpu" and INFERENCE_CONFIG["quantize"] and backend != "onnx":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {nn.Linear}, dtype=torch.qint8
+            )
+            self.quantized = True
+        
+        if TORCH_GEOMETRIC_AVAILABLE and backend == "torchscript":
+            self.model = self._script_model(self.model, model_path, in_channels)
+        elif TORCH_GEOMETRIC_AVAILABLE and backend == "compile":
+            self.model = self._compile_model(self.model, in_channels)
+        elif TORCH_GEOMETRIC_AVAILABLE and backend == "onnx":
+            self.ort_session = self._load_onnx_session(self.model, model_path, in_channels)
+        
+        _model_cache[cache_key] = (mtime, self.model, self.ort_session, self.quantized)
+        
+        print(f"Model loaded (trained for {meta.get('epoch', '?')} epochs)")
+    
+    def _script_model(self, model, model_path, in_channels):
+        """
+        Compile model with TorchScript, reusing a cached scripted module
+        
+        Falls back to the eager model if scripting fails.
+        """
+        suffix = ".int8.scripted.pt" if self.quantized else ".scripted.pt"
+        scripted_path = os.path.splitext(model_path)[0] + suffix
+        
+        try:
+            if (os.path.exists(scripted_path) and
+                    os.path.getmtime(scripted_path) >= os.path.getmtime(model_path)):
+                scripted = torch.jit.load(scripted_path, map_location=self.device)
+            else:
+                # PyG < 2.5 needs jittable() convs before scripting
+                for name in ("conv0", "conv1", "conv2"):
+                    conv = getattr(model, name, None)
+                    if conv is not None and hasattr(conv, "jittable"):
+                        setattr(model, name, conv.jittable())
+                
+                scripted = torch.jit.script(model)
+                
+                # Other workers may be loading or writing the same cache
+                # file - save to a per-process temp file and rename it in
+                tmp_path = f"{scripted_path}.{os.getpid()}.tmp"
+                torch.jit.save(scripted, tmp_path)
+                os.replace(tmp_path, scripted_path)
+            
+            scripted.eval()
+            self._warmup(scripted, in_channels)
+        except Exception as e:
+            print(f"Warning: TorchScript compilation failed ({e}), using eager model")
+            return model
+        
+        print("Model compiled with TorchScript")
+        return scripted
+    
+    def _compile_model(self, model, in_channels):
+        """
+        Compile model with torch.compile (TorchInductor)
+        
+        Falls back to the eager model if compilation is unavailable.
+        """
+        try:
+            # Node count varies per request, so compile with dynamic shapes
+            compiled = torch.compile(model, mode="reduce-overhead", dynamic=True)
+            
+            # Compilation is lazy - warmup triggers it and surfaces errors here
+            self._warmup(compiled, in_channels)
+        except Exception as e:
+            print(f"Warning: torch.compile failed ({e}), using eager model")
+            return model
+        
+        print("Model compiled with torch.compile")
+        return compiled
     
-    def predict(self, transactions, threshold=0.5):
+    def _load_onnx_session(self, model, model_path, in_channels):
+        """
+        Create ONNX Runtime session, exporting the model if needed
+        
+        Returns None (torch inference is used) if ONNX Runtime is unavailable.
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            print("Warning: onnxruntime not installed, using torch model")
+            return None
+        
+        onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+        
+        try:
+            if (not os.path.exists(onnx_path) or
+                    os.path.getmtime(onnx_path) < os.path.getmtime(model_path)):
+                export_onnx(model, in_channels, onnx_path)
+            
+            available = ort.get_available_providers()
+            providers = [
+                p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                if p in available
+            ]
+            session = ort.InferenceSession(onnx_path, providers=providers)
+        except Exception as e:
+            print(f"Warning: ONNX Runtime setup failed ({e}), using torch model")
+            return None
+        
+        print(f"Model served with ONNX Runtime ({session.get_providers()[0]})")
+        return session
+    
+    def _warmup(self, model, in_channels):
+        """Run dummy forward passes so the first request is not slow"""
+        with torch.inference_mode():
+            for num_nodes in INFERENCE_CONFIG["warmup_node_counts"]:
+                x = torch.zeros(num_nodes, in_channels, device=self.device)
+                edge_index = torch.randint(
+                    0, num_nodes, (2, 2 * num_nodes), device=self.device
+                )
+                
+                for _ in range(INFERENCE_CONFIG["warmup_passes"]):
+                    model(x, edge_index)
+    
+    def predict(self, transactions, threshold=0.5, return_summary=False):
         """
         Predict fraud probability for all accounts in transactions
         
         Args:
             transactions: List of transaction dicts
             threshold: Classification threshold
+            return_summary: Also return summary statistics
             
         Returns:
-            List of prediction dicts
+            List of prediction dicts (and summary dict if return_summary)
         """
         if self.model is None:
             raise RuntimeError("Model not loaded. Run train.py first.")
@@ -76,40 +251,101 @@ class FraudPredictor:
         # Build graph
         data, info = self.graph_builder.build_graph(transactions)
         
-        x = data.x.to(self.device)
-        edge_index = data.edge_index.to(self.device)
+        return self.predict_from_graph(data, info, threshold, return_summary)
+    
+    def predict_from_graph(self, data, info, threshold=0.5, return_summary=False):
+        """
+        Predict fraud probability for an already-built transaction graph
         
-        # Get predictions
-        self.model.eval()
-        with torch.no_grad():
-            if TORCH_GEOMETRIC_AVAILABLE:
-                logits = self.model(x, edge_index)
-            else:
-                adj = torch.zeros(x.size(0), x.size(0), device=self.device)
-                for i in range(edge_index.size(1)):
-                    adj[edge_index[0, i], edge_index[1, i]] = 1
-                logits = self.model(x, adj)
+        Args:
+            data: Graph data from TransactionGraphBuilder.build_graph
+            info: Account info from TransactionGraphBuilder.build_graph
+            threshold: Classification threshold
+            return_summary: Also return summary statistics
             
-            probs = torch.softmax(logits, dim=1)
-            fraud_probs = probs[:, 1].cpu().numpy()
+        Returns:
+            List of prediction dicts (and summary dict if return_summary)
+        """
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Run train.py first.")
+        
+        # Get predictions
+        if self.ort_session is not None:
+            logits = self.ort_session.run(None, {
+                "x": data.x.numpy(),
+                "edge_index": data.edge_index.numpy()
+            })[0]
+            # Binary softmax: P(fraud) = sigmoid(logit_fraud - logit_normal)
+            fraud_probs = 1.0 / (1.0 + np.exp(logits[:, 0] - logits[:, 1]))
+        else:
+            fraud_probs = self._forward(data)
+        
+        # Sort by fraud probability (stable, highest first)
+        order = np.argsort(-fraud_probs, kind="stable")
+        fraud_probs = fraud_probs[order].astype(np.float64)
+        
+        # Score all nodes at once in NumPy
+        risk_scores = (fraud_probs * 100).astype(np.int32)
+        is_fraud = fraud_probs >= threshold
+        is_suspicious = fraud_probs >= 0.5
+        
+        summary = {
+            "fraud_detected": int(is_fraud.sum()),
+            "average_risk_score": float(risk_scores.mean()) if risk_scores.size else 0.0
+        }
+        
+        # Gather account IDs in sorted order
+        account_ids = np.asarray(info["idx_to_account"], dtype=object)[order]
         
         # Build result
-        results = []
-        for idx, acc_id in info["idx_to_account"].items():
-            prob = float(fraud_probs[idx])
-            results.append({
+        results = [
+            {
                 "account_id": acc_id,
                 "fraud_probability": prob,
-                "risk_score": int(prob * 100),
-                "label": "fraud" if prob >= threshold else "normal",
-                "is_suspicious": prob >= 0.5
-            })
-        
-        # Sort by fraud probability
-        results.sort(key=lambda x: x["fraud_probability"], reverse=True)
+                "risk_score": risk,
+                "label": "fraud" if fraud else "normal",
+                "is_suspicious": suspicious
+            }
+            for acc_id, prob, risk, fraud, suspicious in zip(
+                account_ids.tolist(),
+                fraud_probs.tolist(),
+                risk_scores.tolist(),
+                is_fraud.tolist(),
+                is_suspicious.tolist()
+            )
+        ]
         
+        if return_summary:
+            return results, summary
         return results
     
+    def _forward(self, data):
+        """Run the torch model and return fraud probabilities as a NumPy array"""
+        # Use the dedicated CUDA stream so copies overlap with other work.
+        # It must first wait for the default stream, where load_model()
+        # copied the weights - otherwise the first forward may read them
+        # before that copy finishes (one event, no host sync).
+        if self.stream is not None:
+            self.stream.wait_stream(torch.cuda.current_stream())
+            stream_ctx = torch.cuda.stream(self.stream)
+        else:
+            stream_ctx = nullcontext()
+        
+        self.model.eval()
+        with stream_ctx, torch.inference_mode():
+            x = data.x.to(self.device, non_blocking=True)
+            edge_index = data.edge_index.to(self.device, non_blocking=True)
+            
+            if TORCH_GEOMETRIC_AVAILABLE:
+                logits = self.model(x, edge_index)
+            else:
+                adj = build_adjacency(edge_index, x.size(0))
+                logits = self.model(x, adj)
+            
+            # Binary softmax: P(fraud) = sigmoid(logit_fraud - logit_normal)
+            fraud_probs = torch.sigmoid(logits[:, 1] - logits[:, 0])
+            return fraud_probs.cpu().numpy()
+    
     def predict_from_json(self, json_path, threshold=0.5):
         """
         Predict from JSON file
@@ -121,8 +357,8 @@ class FraudPredictor:
         Returns:
             List of prediction dicts
         """
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            data = orjson.loads(f.read())
         
         transactions = data.get("transactions", data)
         return self.predict(transactions, threshold)
@@ -0,0 +1,67 @@
+"""
+Checkpoint I/O - Save/load model weights with safetensors
+
+Weights are stored as .safetensors (zero-copy load), metadata such as
+epoch, config and in_channels in a .meta.json file next to them.
+Legacy torch.save() .pt checkpoints can still be loaded.
+"""
+
+import os
+import orjson
+import torch
+from safetensors.torch import save_file, load_file
+
+
+def meta_path(path):
+    """Metadata file stored next to a checkpoint"""
+    return os.path.splitext(path)[0] + ".meta.json"
+
+
+def save_checkpoint(state_dict, meta, path):
+    """
+    Save model weights and metadata
+    
+    Args:
+        state_dict: Model state dict
+        meta: JSON-serializable metadata (epoch, config, ...)
+        path: Output .safetensors path
+    """
+    # Metadata first, so the weights file never appears without it.
+    # Both are written to a temp file and renamed into place, so servers
+    # polling the checkpoint never load a half-written file.
+    tmp_meta = meta_path(path) + ".tmp"
+    with open(tmp_meta, 'wb') as f:
+        f.write(orjson.dumps(meta, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_meta, meta_path(path))
+    
+    tmp_path = path + ".tmp"
+    save_file({k: v.contiguous() for k, v in state_dict.items()}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, device="cpu"):
+    """
+    Load model weights and metadata
+    
+    Args:
+        path: .safetensors (or legacy .pt) checkpoint path
+        device: Device to load tensors onto
+        
+    Returns:
+        state_dict: Model state dict
+        meta: Metadata dict
+    """
+    if path.endswith(".pt"):
+        checkpoint = torch.load(path, map_location=device)
+        state_dict = checkpoint.pop("model_state_dict")
+        checkpoint.pop("optimizer_state_dict", None)
+        return state_dict, checkpoint
+    
+    state_dict = load_file(path, device=str(device))
+    
+    meta = {}
+    if os.path.exists(meta_path(path)):
+        with open(meta_path(path), 'rb') as f:
+            meta = orjson.loads(f.read())
+    
+    return state_dict, meta
@@ -6,11 +6,69 @@ Creates realistic transaction patterns including:
 - Mule account chains (money laundering patterns)
 """
 
-import json
-import random
+import orjson
 import numpy as np
 from datetime import datetime, timedelta
 
+# numba is optional - it only speeds up very large mule-chain batches
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Below this many chains the NumPy path wins (numba has a compile cost)
+NUMBA_MIN_CHAINS = 10000
+
+
+def _mule_chain_core_numpy(victims, initial, factors, num_normal, out_src, out_dst, out_amt):
+    """
+    Fill flat per-hop arrays for all mule chains (NumPy version)
+    
+    Chain c is victims[c] -> mule (c, 0) -> mule (c, 1) -> ...; mule (c, k)
+    is account index num_normal + c * chain_length + k.
+    
+    Args:
+        victims: Victim (normal account) index per chain [num_chains]
+        initial: Initial deposit per chain [num_chains]
+        factors: Amount kept at each later hop [num_chains, chain_length - 1]
+        num_normal: Number of normal accounts (mule indices start here)
+        out_src, out_dst, out_amt: Output arrays [num_chains * chain_length]
+    """
+    num_chains, chain_length = factors.shape[0], factors.shape[1] + 1
+    mules = num_normal + np.arange(num_chains * chain_length).reshape(num_chains, chain_length)
+    
+    src = np.empty_like(mules)
+    src[:, 0] = victims
+    src[:, 1:] = mules[:, :-1]
+    
+    # Each hop loses some money (fees, withdrawal): a running product
+    amt = np.empty((num_chains, chain_length))
+    amt[:, 0] = initial
+    amt[:, 1:] = initial[:, None] * np.cumprod(factors, axis=1)
+    
+    out_src[:] = src.ravel()
+    out_dst[:] = mules.ravel()
+    out_amt[:] = amt.ravel()
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _mule_chain_core_numba(victims, initial, factors, num_normal, out_src, out_dst, out_amt):
+        """Fill flat per-hop arrays for all mule chains (numba version)"""
+        num_chains, chain_length = factors.shape[0], factors.shape[1] + 1
+        for c in prange(num_chains):
+            base = c * chain_length
+            prev = victims[c]
+            amount = initial[c]
+            for k in range(chain_length):
+                out_src[base + k] = prev
+                out_dst[base + k] = num_normal + base + k
+                out_amt[base + k] = amount
+                if k < chain_length - 1:
+                    amount *= factors[c, k]
+                prev = num_normal + base + k
+
 
 class FraudDataGenerator:
     """
@@ -18,8 +76,8 @@ class FraudDataGenerator:
     """
     
     def __init__(self, seed=42):
-        random.seed(seed)
         np.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
         
         # Thai bank codes
         self.banks = ["SCB", "KBANK", "TTB", "BBL", "BAY"]
@@ -35,6 +93,11 @@ class FraudDataGenerator:
             "เจริญผล", "แสงทอง", "วิบูลย์", "เพชรดี", "รักชาติ"
         ]
         
+        # Every "first last" combination, so a name is one index draw
+        self.full_names = [
+            f"{first} {last}" for first in self.first_names for last in self.last_names
+        ]
+        
     def generate_dataset(self, num_normal=50, num_mule_chains=5, chain_length=4):
         """
         Generate a complete dataset with normal and fraudulent transactions
@@ -47,69 +110,65 @@ class FraudDataGenerator:
         Returns:
             dict: Dataset with transactions, accounts, and labels
         """
-        accounts = []
-        transactions = []
-        labels = {}
+        if num_normal < 2:
+            raise ValueError("num_normal must be at least 2")
+        if chain_length < 1:
+            raise ValueError("chain_length must be at least 1")
         
         # Generate normal accounts
-        for i in range(num_normal):
-            acc_id = f"NORM{i:04d}"
-            bank = random.choice(self.banks)
-            account = self._create_account(acc_id, bank, "normal")
-            accounts.append(account)
-            labels[acc_id] = 0  # Normal
+        normal_ids = [f"NORM{i:04d}" for i in range(num_normal)]
+        accounts = self._create_accounts(normal_ids, "normal")
+        labels = {acc_id: 0 for acc_id in normal_ids}  # Normal
         
         # Generate mule chains
-        mule_accounts = []
-        for chain in range(num_mule_chains):
-            chain_accounts = []
-            for pos in range(chain_length):
-                acc_id = f"MULE{chain:02d}{pos:02d}"
-                bank = random.choice(self.banks)
-                account = self._create_account(acc_id, bank, "mule")
-                accounts.append(account)
-                chain_accounts.append(acc_id)
-                labels[acc_id] = 1  # Fraud/Mule
-            mule_accounts.append(chain_accounts)
+        mule_ids = [
+            f"MULE{chain:02d}{pos:02d}"
+            for chain in range(num_mule_chains)
+            for pos in range(chain_length)
+        ]
+        accounts += self._create_accounts(mule_ids, "mule")
+        labels.update({acc_id: 1 for acc_id in mule_ids})  # Fraud/Mule
         
         # Generate normal transactions (between normal accounts)
-        for _ in range(num_normal * 2):
-            normal_accs = [a["id"] for a in accounts if a["type"] == "normal"]
-            from_acc = random.choice(normal_accs)
-            to_acc = random.choice([a for a in normal_accs if a != from_acc])
-            
-            tx = self._create_transaction(from_acc, to_acc, "normal")
-            transactions.append(tx)
-        
-        # Generate mule chain transactions (money laundering pattern)
-        for chain in mule_accounts:
-            # Initial large deposit from "victim"
-            victim = random.choice([a["id"] for a in accounts if a["type"] == "normal"])
-            initial_amount = random.uniform(200000, 500000)
-            
-            # Transfer through chain
-            current_amount = initial_amount
-            for i in range(len(chain) - 1):
-                # Each transfer loses some money (fees, withdrawal)
-                transfer_amount = current_amount * random.uniform(0.85, 0.95)
-                tx = self._create_transaction(
-                    chain[i] if i > 0 else victim,
-                    chain[i] if i == 0 else chain[i],
-                    "suspicious",
-                    amount=transfer_amount
-                )
-                transactions.append(tx)
-                
-                # Transfer to next in chain
-                if i < len(chain) - 1:
-                    tx = self._create_transaction(
-                        chain[i],
-                        chain[i + 1],
-                        "suspicious",
-                        amount=transfer_amount * random.uniform(0.9, 0.98)
-                    )
-                    transactions.append(tx)
-                    current_amount = transfer_amount * 0.95
+        num_normal_tx = num_normal * 2
+        from_idx = self.rng.integers(0, num_normal, size=num_normal_tx)
+        
+        # A non-zero offset picks a uniformly random *other* account,
+        # so there are no self-transfers to reject
+        offsets = self.rng.integers(1, num_normal, size=num_normal_tx)
+        to_idx = (from_idx + offsets) % num_normal
+        
+        transactions = self._create_transactions(
+            [normal_ids[i] for i in from_idx.tolist()],
+            [normal_ids[i] for i in to_idx.tolist()],
+            "normal"
+        )
+        
+        # Generate mule chain transactions (money laundering pattern):
+        # victim -> chain[0] -> chain[1] -> ... (one transfer per hop).
+        # Random draws happen here, so both cores see identical inputs.
+        victims = self.rng.integers(0, num_normal, size=num_mule_chains)
+        initial = self.rng.uniform(200000, 500000, size=num_mule_chains)
+        factors = self.rng.uniform(0.85, 0.95, size=(num_mule_chains, chain_length - 1))
+        
+        num_hops = num_mule_chains * chain_length
+        mule_src = np.empty(num_hops, dtype=np.int64)
+        mule_dst = np.empty(num_hops, dtype=np.int64)
+        mule_amounts = np.empty(num_hops)
+        
+        if NUMBA_AVAILABLE and num_mule_chains >= NUMBA_MIN_CHAINS:
+            mule_core = _mule_chain_core_numba
+        else:
+            mule_core = _mule_chain_core_numpy
+        mule_core(victims, initial, factors, num_normal, mule_src, mule_dst, mule_amounts)
+        
+        account_ids = normal_ids + mule_ids
+        transactions += self._create_transactions(
+            [account_ids[i] for i in mule_src.tolist()],
+            [account_ids[i] for i in mule_dst.tolist()],
+            "suspicious",
+            amounts=mule_amounts
+        )
         
         return {
             "accounts": accounts,
@@ -125,47 +184,82 @@ class FraudDataGenerator:
             }
         }
     
-    def _create_account(self, acc_id, bank, acc_type):
-        """Create an account dictionary"""
-        return {
-            "id": acc_id,
-            "bank": bank,
-            "type": acc_type,
-            "name": f"{random.choice(self.first_names)} {random.choice(self.last_names)}",
-            "balance": random.uniform(1000, 100000) if acc_type == "normal" else random.uniform(0, 5000),
-            "created_at": (datetime.now() - timedelta(days=random.randint(30, 3650))).isoformat()
-        }
+    def _create_accounts(self, acc_ids, acc_type):
+        """Create account dictionaries, drawing all random fields in one batch"""
+        n = len(acc_ids)
+        
+        bank_idx = self.rng.integers(0, len(self.banks), size=n)
+        name_idx = self.rng.integers(0, len(self.full_names), size=n)
+        if acc_type == "normal":
+            balances = self.rng.uniform(1000, 100000, size=n)
+        else:
+            balances = self.rng.uniform(0, 5000, size=n)
+        age_days = self.rng.integers(30, 3650, size=n, endpoint=True)
+        
+        now = datetime.now()
+        return [
+            {
+                "id": acc_id,
+                "bank": self.banks[b],
+                "type": acc_type,
+                "name": self.full_names[name],
+                "balance": balance,
+                "created_at": (now - timedelta(days=age)).isoformat()
+            }
+            for acc_id, b, name, balance, age in zip(
+                acc_ids,
+                bank_idx.tolist(),
+                name_idx.tolist(),
+                balances.tolist(),
+                age_days.tolist()
+            )
+        ]
     
-    def _create_transaction(self, from_acc, to_acc, tx_type, amount=None):
-        """Create a transaction dictionary"""
-        if amount is None:
+    def _create_transactions(self, from_accs, to_accs, tx_type, amounts=None):
+        """Create transaction dictionaries, drawing all random fields in one batch"""
+        n = len(from_accs)
+        
+        if amounts is None:
             if tx_type == "normal":
-                amount = random.uniform(100, 10000)
+                amounts = self.rng.uniform(100, 10000, size=n)
             else:
-                amount = random.uniform(50000, 200000)
+                amounts = self.rng.uniform(50000, 200000, size=n)
+        tx_ids = self.rng.integers(100000, 999999, size=n, endpoint=True)
+        hours_ago = self.rng.integers(0, 168, size=n, endpoint=True)
         
-        return {
-            "id": f"TX{random.randint(100000, 999999)}",
-            "from": from_acc,
-            "to": to_acc,
-            "amount": round(amount, 2),
-            "type": tx_type,
-            "timestamp": (datetime.now() - timedelta(
-                hours=random.randint(0, 168)
-            )).isoformat(),
-            "currency": "THB"
-        }
+        now = datetime.now()
+        return [
+            {
+                "id": f"TX{tx_id}",
+                "from": from_acc,
+                "to": to_acc,
+                "amount": amount,
+                "type": tx_type,
+                "timestamp": (now - timedelta(hours=hours)).isoformat(),
+                "currency": "THB"
+            }
+            for from_acc, to_acc, amount, tx_id, hours in zip(
+                from_accs,
+                to_accs,
+                np.round(amounts, 2).tolist(),
+                tx_ids.tolist(),
+                hours_ago.tolist()
+            )
+        ]
     
     def save_dataset(self, dataset, filepath):
         """Save dataset to JSON file"""
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(dataset, f, ensure_ascii=False, indent=2)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(
+                dataset,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+            ))
         print(f"Dataset saved to {filepath}")
     
     def load_dataset(self, filepath):
         """Load dataset from JSON file"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            return orjson.loads(f.read())
 
 
 if __name__ == "__main__":
@@ -7,6 +7,8 @@ Step 1 of GNN: Graph Construction
 - Node features = Account statistics
 """
 
+from array import array
+
 import numpy as np
 
 try:
@@ -27,14 +29,15 @@ class TransactionGraphBuilder:
     
     def __init__(self):
         self.account_to_idx = {}  # Map account ID to node index
-        self.idx_to_account = {}  # Map node index to account ID
+        self.idx_to_account = []  # Node index -> account ID (list position)
         
     def build_graph(self, transactions, account_labels=None):
         """
         Build graph from list of transactions
         
         Args:
-            transactions: List of transaction dicts
+            transactions: List (or any single-pass iterable, e.g. a stream
+                from disk) of transaction dicts
                 [{"from": "ACC001", "to": "ACC002", "amount": 1000, ...}, ...]
             account_labels: Optional dict mapping account_id to label (0=normal, 1=fraud)
             
@@ -45,53 +48,67 @@ class TransactionGraphBuilder:
         if not TORCH_AVAILABLE:
             raise ImportError("PyTorch is required. Install with: pip install torch")
         
-        # Reset mappings
-        self.account_to_idx = {}
-        self.idx_to_account = {}
-        
-        # Step 1a: Extract unique accounts (Nodes)
-        accounts = set()
+        # One pass over the transactions, so a streamed iterable works too.
+        # array('d') appends at C level and hands its buffer to NumPy.
+        from_ids, to_ids = [], []
+        amount = array("d")
         for tx in transactions:
-            accounts.add(tx.get("from") or tx.get("debtor"))
-            accounts.add(tx.get("to") or tx.get("creditor"))
+            from_ids.append(tx.get("from") or tx.get("debtor"))
+            to_ids.append(tx.get("to") or tx.get("creditor"))
+            amount.append(tx.get("amount", 0))
         
-        accounts = sorted(list(accounts))
-        
-        for idx, acc in enumerate(accounts):
-            self.account_to_idx[acc] = idx
-            self.idx_to_account[idx] = acc
+        num_tx = len(amount)
+        amount = np.frombuffer(amount, dtype=np.float64)
         
+        # Step 1a: Extract unique accounts (Nodes)
+        # np.array would silently stringify mixed IDs (1 -> "1"), and labels
+        # keyed by the original IDs would then never match - refuse instead
+        all_ids = from_ids + to_ids
+        id_types = set(map(type, all_ids))
+        if len(id_types) > 1:
+            names = ", ".join(sorted(t.__name__ for t in id_types))
+            raise TypeError(f"Account IDs must all be the same type, got: {names}")
+        
+        # np.unique sorts the endpoint IDs and maps every endpoint back to
+        # its node index (the inverse) in one call. IDs are left to become a
+        # fixed-width string array - object arrays sort far slower.
+        accounts, inverse = np.unique(np.array(all_ids), return_inverse=True)
+        accounts = accounts.tolist()
         num_nodes = len(accounts)
         
-        # Step 1b: Build edges from transactions
-        edge_index = []
-        edge_attr = []  # Edge features (amount, etc.)
+        # Mappings are built locally so concurrent calls on a shared
+        # builder never see each other's partial state
+        account_to_idx = dict(zip(accounts, range(num_nodes)))
         
-        for tx in transactions:
-            from_acc = tx.get("from") or tx.get("debtor")
-            to_acc = tx.get("to") or tx.get("creditor")
-            
-            from_idx = self.account_to_idx[from_acc]
-            to_idx = self.account_to_idx[to_acc]
-            
-            edge_index.append([from_idx, to_idx])
-            edge_attr.append([tx.get("amount", 0)])
+        # Per-transaction endpoint indices and amounts as arrays
+        inverse = inverse.reshape(-1).astype(np.int64, copy=False)
+        src = inverse[:num_tx]
+        dst = inverse[num_tx:]
         
-        edge_index = torch.tensor(edge_index, dtype=torch.long).t().contiguous()
-        edge_attr = torch.tensor(edge_attr, dtype=torch.float)
+        # Step 1b: Build edges from transactions
+        edge_index = torch.from_numpy(np.stack([src, dst]))
+        edge_attr = torch.from_numpy(amount.astype(np.float32)).unsqueeze(1)  # Edge features (amount)
         
         # Step 1c: Compute node features
-        node_features = self._compute_node_features(accounts, transactions)
-        x = torch.tensor(node_features, dtype=torch.float)
+        # Kept in fp32: counts/degrees and the average amount are unbounded
+        # and would overflow fp16 (max 65504) on hub accounts or large transfers
+        node_features = self._compute_node_features(num_nodes, src, dst, amount)
+        x = torch.from_numpy(node_features)
         
         # Step 1d: Add labels if provided
         if account_labels:
-            y = torch.tensor([
-                account_labels.get(acc, 0) for acc in accounts
-            ], dtype=torch.long)
+            y = torch.from_numpy(np.fromiter(
+                (account_labels.get(acc, 0) for acc in accounts),
+                dtype=np.int64, count=num_nodes
+            ))
         else:
             y = torch.zeros(num_nodes, dtype=torch.long)
         
+        # Pinned host memory allows non_blocking copies to the GPU
+        if torch.cuda.is_available():
+            x = x.pin_memory()
+            edge_index = edge_index.pin_memory()
+        
         # Create PyTorch Geometric Data object
         data = Data(
             x=x,
@@ -101,15 +118,19 @@ class TransactionGraphBuilder:
         )
         
         account_info = {
-            "account_to_idx": self.account_to_idx,
-            "idx_to_account": self.idx_to_account,
+            "account_to_idx": account_to_idx,
+            "idx_to_account": accounts,
             "num_nodes": num_nodes,
             "num_edges": edge_index.size(1)
         }
         
+        # Keep mappings of the most recent graph on the builder
+        self.account_to_idx = account_to_idx
+        self.idx_to_account = accounts
+        
         return data, account_info
     
-    def _compute_node_features(self, accounts, transactions):
+    def _compute_node_features(self, num_nodes, src, dst, amount):
         """
         Compute features for each node (account)
         
@@ -121,77 +142,44 @@ class TransactionGraphBuilder:
         5. unique_counterparties
         6. in_degree (incoming transfers)
         7. out_degree (outgoing transfers)
-        """
-        num_nodes = len(accounts)
-        features = np.zeros((num_nodes, 7))
-        
-        # Aggregate statistics per account
-        account_stats = {acc: {
-            "in_amount": 0,
-            "out_amount": 0,
-            "in_count": 0,
-            "out_count": 0,
-            "counterparties": set(),
-            "balance": np.random.uniform(1000, 100000),  # Simulated
-            "age": np.random.randint(30, 3650)  # Simulated age in days
-        } for acc in accounts}
-        
-        for tx in transactions:
-            from_acc = tx.get("from") or tx.get("debtor")
-            to_acc = tx.get("to") or tx.get("creditor")
-            amount = tx.get("amount", 0)
-            
-            account_stats[from_acc]["out_amount"] += amount
-            account_stats[from_acc]["out_count"] += 1
-            account_stats[from_acc]["counterparties"].add(to_acc)
-            
-            account_stats[to_acc]["in_amount"] += amount
-            account_stats[to_acc]["in_count"] += 1
-            account_stats[to_acc]["counterparties"].add(from_acc)
-        
-        # Convert to feature matrix
-        for i, acc in enumerate(accounts):
-            stats = account_stats[acc]
-            
-            total_tx = stats["in_count"] + stats["out_count"]
-            total_amount = stats["in_amount"] + stats["out_amount"]
-            
-            features[i, 0] = stats["balance"] / 100000  # Normalized balance
-            features[i, 1] = total_tx  # Transaction count
-            features[i, 2] = (total_amount / max(total_tx, 1)) / 10000  # Avg tx amount
-            features[i, 3] = stats["age"] / 365  # Age in years
-            features[i, 4] = len(stats["counterparties"])  # Unique counterparties
-            features[i, 5] = stats["in_count"]  # In-degree
-            features[i, 6] = stats["out_count"]  # Out-degree
-        
-        return features
-    
-    def build_adjacency_matrix(self, num_nodes, edge_index):
-        """
-        Build adjacency matrix from edge_index
         
         Args:
             num_nodes: Number of nodes
-            edge_index: Edge connectivity tensor [2, num_edges]
-            
-        Returns:
-            adj: Adjacency matrix [num_nodes, num_nodes]
+            src: Sender node index per transaction [num_tx]
+            dst: Receiver node index per transaction [num_tx]
+            amount: Amount per transaction [num_tx]
         """
-        adj = torch.zeros(num_nodes, num_nodes)
+        features = np.zeros((num_nodes, 7), dtype=np.float32)
+        
+        # Aggregate statistics per account
+        out_amount = np.bincount(src, weights=amount, minlength=num_nodes)
+        in_amount = np.bincount(dst, weights=amount, minlength=num_nodes)
+        out_count = np.bincount(src, minlength=num_nodes)
+        in_count = np.bincount(dst, minlength=num_nodes)
+        
+        # Unique counterparties = distinct (account, other) pairs, both directions
+        pairs = np.unique(np.concatenate([
+            src * num_nodes + dst,
+            dst * num_nodes + src
+        ]))
+        counterparties = np.bincount(pairs // num_nodes, minlength=num_nodes)
         
-        for i in range(edge_index.size(1)):
-            src = edge_index[0, i].item()
-            dst = edge_index[1, i].item()
-            adj[src, dst] = 1
+        balance = np.random.uniform(1000, 100000, size=num_nodes)  # Simulated
+        age = np.random.randint(30, 3650, size=num_nodes)  # Simulated age in days
         
-        # Add self-loops
-        adj = adj + torch.eye(num_nodes)
+        # Convert to feature matrix
+        total_tx = in_count + out_count
+        total_amount = in_amount + out_amount
         
-        # Normalize (D^-1 * A)
-        degree = adj.sum(dim=1, keepdim=True)
-        adj = adj / degree.clamp(min=1)
+        features[:, 0] = balance / 100000  # Normalized balance
+        features[:, 1] = total_tx  # Transaction count
+        features[:, 2] = (total_amount / np.maximum(total_tx, 1)) / 10000  # Avg tx amount
+        features[:, 3] = age / 365  # Age in years
+        features[:, 4] = counterparties  # Unique counterparties
+        features[:, 5] = in_count  # In-degree
+        features[:, 6] = out_count  # Out-degree
         
-        return adj
+        return features
 
 
 def build_graph_from_json(json_data, labels=None):